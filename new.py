@@ -1,15 +1,20 @@
 import os
+import sys
 import io
-import base64
+import matplotlib
+matplotlib.use('Agg')  # headless rendering; skip interactive backend detection
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
+from matplotlib.collections import LineCollection
 import numpy as np
-import pandas as pd
 import datetime
 import time
+import threading
 from scipy.interpolate import make_interp_spline
 from psycopg2 import connect, Error
-from flask import Flask, render_template_string, request
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import closing
+from flask import Flask, Response, make_response, render_template_string, request
 import logging
 import warnings
 
@@ -33,7 +38,6 @@ HTML_TEMPLATE = """
 <html>
 <head>
     <title>Vibration Data Dashboard</title>
-    <meta http-equiv="refresh" content="0.5" id="refresh">
     <style>
         body { background-color: #f5f5f5; font-family: Arial, sans-serif; margin: 20px; }
         img { max-width: 100%; height: auto; }
@@ -47,68 +51,169 @@ HTML_TEMPLATE = """
         <form method="post">
             <button type="submit" name="pause">{{ 'Resume' if is_paused else 'Pause' }}</button>
         </form>
-        <img src="data:image/png;base64,{{ img_data }}" alt="Vibration Plot">
+        <img id="plot" src="/plot.png?v={{ frame_version }}" alt="Vibration Plot">
     </div>
     <script>
-        var refresh = document.getElementById('refresh');
-        if ({{ is_paused|tojson }}) {
-            refresh.remove();
+        var plot = document.getElementById('plot');
+        if (!{{ is_paused|tojson }}) {
+            var source = new EventSource('/stream');
+            source.onmessage = function(event) {
+                plot.src = '/plot.png?v=' + event.data;
+            };
         }
     </script>
 </body>
 </html>
 """
 
-# Initialize lists and state
-time_values = []
-h_vel_values = []
-v_vel_values = []
-a_vel_values = []
-h_freq_values = []
-v_freq_values = []
-a_freq_values = []
-all_time_values = []
-all_h_vel_values = []
-all_v_vel_values = []
-all_a_vel_values = []
+# Fixed-capacity rolling store for time, velocities and frequencies. Every sample
+# is written twice (at i and i + capacity) so the live window is always a single
+# contiguous slice and never needs np.roll or concatenation.
+class RingBuffer:
+    T, H, V, A, H_FREQ, V_FREQ, A_FREQ = range(7)
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.empty((7, 2 * capacity), dtype=np.float64)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self, capacity=0):
+        if capacity > self.capacity:
+            self.capacity = capacity
+            self.data = np.empty((7, 2 * capacity), dtype=np.float64)
+        self.head = 0
+        self.size = 0
+
+    def append(self, t, h, v, a):
+        if self.size == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            self.size -= 1
+        idx = (self.head + self.size) % self.capacity
+        self.data[:4, idx] = (t, h, v, a)
+        self.data[:4, idx + self.capacity] = (t, h, v, a)
+        self.size += 1
+
+    def load(self, *columns):
+        count = len(columns[0])
+        self.clear(count)
+        self.data[:, :count] = columns
+        self.data[:, self.capacity:self.capacity + count] = columns
+        self.size = count
+
+    def set_frequencies(self, h_freq, v_freq, a_freq):
+        idx = (self.head + self.size - 1) % self.capacity
+        self.data[4:, idx] = (h_freq, v_freq, a_freq)
+        self.data[4:, idx + self.capacity] = (h_freq, v_freq, a_freq)
+
+    def drop_before(self, cutoff):
+        count = int(np.searchsorted(self.view()[self.T], cutoff, side='left'))
+        self.head = (self.head + count) % self.capacity
+        self.size -= count
+
+    def view(self):
+        return self.data[:, self.head:self.head + self.size]
+
+# Initialize buffers and state
+buffer_capacity = 4096
+samples = RingBuffer(buffer_capacity)
+window_data = (np.empty(0), np.empty(0), np.empty(0), np.empty(0))
 current_sensor_id = 1  # Default value
 is_valid_sensor_id = True
 selected_month = None
 is_month_active = False
 time_window = 120
 freq_window = 10
+# Velocities within this many mm/s of the window mean count as on the mean (not
+# below it). It absorbs the last-bit differences between the batched and
+# per-window means, so ties classify the same way in both frequency functions.
+freq_tie_tolerance = 1e-6
 start_time = time.time()
 is_paused = False
 window_start_time = None
+stream_interval = 0.5
+ist_offset = 5 * 3600 + 30 * 60  # tick labels show IST (UTC+05:30) wall-clock time
+smoothing_enabled = True
+smoothing_max_points = 500  # spline-smooth only short windows
+max_plot_points = 960  # about one point per pixel column of the rendered plot
+last_frame = None
+last_frame_key = None
+# Frames are rendered only by render_loop; handlers read the latest published one
+latest_frame = None
+frame_version = 0
+frame_ready = threading.Condition()
+frame_requested = threading.Event()
 scroll_step = 60
 is_scrolling = True
 show_h = True
 show_v = True
 show_a = True
 
-# Database connection with retry logic using DATABASE_URL
-def connect_db():
-    max_retries = 3
-    retry_delay = 5
-    for attempt in range(max_retries):
-        try:
-            db_url = os.getenv("DATABASE_URL")
-            if not db_url:
-                raise ValueError("DATABASE_URL environment variable not set")
-            conn = connect(db_url)
-            cursor = conn.cursor()
-            logger.info("Connected to PostgreSQL successfully!")
-            return conn, cursor
-        except Error as e:
-            logger.error(f"Error connecting to PostgreSQL (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                logger.error("Failed to connect to database after retries. Exiting.")
-                exit()
-conn, cursor = connect_db()
+# Pooled database connections using DATABASE_URL (point it at PgBouncer with
+# pool_mode = transaction in production). The pool keeps minconn connections
+# open between queries; with minconn=0 putconn would close every connection.
+# A broken connection is discarded, so an outage fails the current refresh and
+# the next query reconnects instead of the app exiting.
+db_url = os.getenv("DATABASE_URL")
+if not db_url:
+    raise ValueError("DATABASE_URL environment variable not set")
+db_pool = ThreadedConnectionPool(1, 20, db_url)
+
+def query_rows(query, params):
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        conn.commit()
+    except Exception:
+        db_pool.putconn(conn, close=True)
+        raise
+    db_pool.putconn(conn)
+    return rows
 
-def fetch_latest_data():
+# Covering index for the (sensor_id, sample) range queries below, so the window
+# and month queries are served by an Index-Only Scan. CONCURRENTLY cannot run
+# inside a transaction. Index-Only Scans skip the heap only for pages marked
+# all-visible, and samples is insert-only, so autovacuum is also told to visit
+# it after inserts rather than waiting for updates/deletes that never come.
+# This is DDL that can take a while on a large table, so it only runs as a
+# one-off migration: python new.py --migrate
+INDEX_VALID_SQL = "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass('ix_samples_sensor_sample')"
+
+def ensure_indexes():
+    try:
+        with closing(connect(db_url, connect_timeout=10)) as conn:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                # An interrupted CONCURRENTLY build leaves an INVALID index behind
+                # that IF NOT EXISTS would accept, so drop it and build again
+                cursor.execute(INDEX_VALID_SQL)
+                row = cursor.fetchone()
+                if row is not None and not row[0]:
+                    logger.warning("Index ix_samples_sensor_sample is invalid; rebuilding it.")
+                    cursor.execute("DROP INDEX CONCURRENTLY ix_samples_sensor_sample")
+                cursor.execute("""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_samples_sensor_sample
+                    ON samples (sensor_id, sample) INCLUDE (h_vel, v_vel, a_vel)
+                """)
+                cursor.execute(INDEX_VALID_SQL)
+                row = cursor.fetchone()
+                if row is not None and row[0]:
+                    logger.info("Index ix_samples_sensor_sample is in place.")
+                else:
+                    logger.error("Index ix_samples_sensor_sample is missing or invalid.")
+                cursor.execute("""
+                    ALTER TABLE samples SET (autovacuum_vacuum_insert_scale_factor = 0.01,
+                                             autovacuum_vacuum_insert_threshold = 10000)
+                """)
+    except Error as e:
+        logger.error(f"Error preparing samples indexes: {e}")
+
+def fetch_window_data(window_start, window_end):
     try:
         logger.info("Fetching data...")
         if not is_valid_sensor_id or current_sensor_id is None:
@@ -120,13 +225,12 @@ def fetch_latest_data():
             start_date = datetime.datetime(current_year, selected_month, 1)
             end_date = (start_date + datetime.timedelta(days=31)).replace(day=1, year=current_year) - datetime.timedelta(days=1)
             logger.info(f"Querying data for {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-            cursor.execute("""
+            rows = query_rows("""
                 SELECT h_vel, v_vel, a_vel, sample
                 FROM samples 
-                WHERE sensor_id = %s AND sample >= %s AND sample <= %s
+                WHERE sensor_id = %s AND sample BETWEEN %s AND %s
                 ORDER BY sample
             """, (current_sensor_id, start_date, end_date))
-            rows = cursor.fetchall()
             if rows:
                 times = []
                 h_vels = []
@@ -149,22 +253,18 @@ def fetch_latest_data():
             logger.info("No data found for the selected month.")
             return None, None, None, None
             
-        cursor.execute("""
-            SELECT h_vel, v_vel, a_vel, sample 
-            FROM samples 
-            WHERE sensor_id = %s 
-            ORDER BY sample DESC LIMIT 1
-        """, (current_sensor_id,))
-        row = cursor.fetchone()
-        if row:
-            h_vel = float(row[0]) if row[0] is not None else 0.0
-            v_vel = float(row[1]) if row[1] is not None else 0.0
-            a_vel = float(row[2]) if row[2] is not None else 0.0
-            sample_time = float(row[3]) if row[3] is not None else time.time()
-            current_time = sample_time - start_time  # Use sample as a time proxy
-            logger.info(f"Fetched latest data: time={current_time}, h_vel={h_vel}, v_vel={v_vel}, a_vel={a_vel}")
-            return current_time, h_vel, v_vel, a_vel
-        logger.info("No data found for the latest point.")
+        rows = query_rows("""
+            SELECT h_vel, v_vel, a_vel, sample
+            FROM samples
+            WHERE sensor_id = %s AND sample BETWEEN %s AND %s
+            ORDER BY sample
+        """, (current_sensor_id, window_start + start_time, window_end + start_time))
+        if rows:
+            times = np.array([float(row[3]) for row in rows]) - start_time  # Use sample as a time proxy
+            vels = np.nan_to_num(np.array([row[:3] for row in rows], dtype=np.float64), nan=0.0)
+            logger.info(f"Fetched {len(times)} rows for window {window_start:.2f}-{window_end:.2f}.")
+            return times, vels[:, 0], vels[:, 1], vels[:, 2]
+        logger.info("No data found in the current window.")
         return None, None, None, None
     except Exception as e:
         logger.error(f"Error fetching data: {e}")
@@ -173,159 +273,185 @@ def fetch_latest_data():
 def compute_real_frequency(times, velocities):
     if len(times) < 2 or len(velocities) < 2:
         return 0.01
-    if isinstance(times[0], (int, float)):
-        times = [t for t in times]  # Ensure times are numeric
-    current_time = times[-1]
-    window_start = current_time - freq_window
-    window_times = []
-    window_velocities = []
-    for t, v in zip(times, velocities):
-        if t >= window_start:
-            window_times.append(t)
-            window_velocities.append(v)
+    # times are monotonic, so the window start is a binary search away
+    window_start = np.searchsorted(times, times[-1] - freq_window)
+    window_times = times[window_start:]
+    window_velocities = velocities[window_start:]
     if len(window_times) < 2 or len(window_velocities) < 2:
         return 0.01
-    vel_mean = np.mean(window_velocities)
-    centered_vel = np.array(window_velocities) - vel_mean
-    zero_crossings = 0
-    for i in range(1, len(centered_vel)):
-        if centered_vel[i-1] * centered_vel[i] < 0:
-            zero_crossings += 1
+    below = window_velocities - window_velocities.mean() < -freq_tie_tolerance
+    zero_crossings = np.count_nonzero(np.diff(below))
     time_duration = window_times[-1] - window_times[0]
     if time_duration <= 0:
         return 0.01
     freq = (zero_crossings / 2) / time_duration
     return max(0.01, min(freq, 10))
 
+# Batched equivalent of calling compute_real_frequency on every prefix of the
+# series. Window means come from a cumulative sum and crossings are counted one
+# lag at a time across all windows, so the cost is O(n * samples per window)
+# vectorized instead of O(n^2) Python work. The series is centered on its
+# overall mean first so the month-long cumulative sum stays small, keeping the
+# means within freq_tie_tolerance of what compute_real_frequency computes.
+def compute_frequency_series(times, velocities):
+    count = len(times)
+    if count < 2:
+        return np.full(count, 0.01)
+    ends = np.arange(count)
+    starts = np.searchsorted(times, times - freq_window)
+    lengths = ends - starts + 1
+    centered = velocities - velocities.mean()
+    cumulative = np.concatenate(([0.0], np.cumsum(centered)))
+    thresholds = (cumulative[ends + 1] - cumulative[starts]) / lengths - freq_tie_tolerance
+    zero_crossings = np.zeros(count, dtype=np.int64)
+    for lag in range(int(lengths.max()) - 1):
+        pair_end = ends - lag
+        safe_end = np.maximum(pair_end, 1)
+        crossed = (centered[safe_end - 1] < thresholds) != (centered[safe_end] < thresholds)
+        zero_crossings += crossed & (pair_end > starts)
+    time_duration = times - times[starts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        freqs = (zero_crossings / 2) / time_duration
+    freqs = np.clip(freqs, 0.01, 10)
+    freqs[(lengths < 2) | ~(time_duration > 0)] = 0.01
+    return freqs
+
+# Seconds since the epoch; naive datetimes are taken as UTC
+def to_epoch(dt):
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
 def update_xticks_with_military_time(ax, ticks, start_time):
-    labels = []
-    for tick in ticks:
-        abs_time = start_time + tick
-        dt = datetime.datetime.fromtimestamp(abs_time, tz=datetime.timezone(datetime.timedelta(hours=5, minutes=30)))
-        military_time = dt.strftime('%H:%M')
-        labels.append(f"{int(tick)}\n{military_time}")
+    ticks = np.asarray(ticks)
+    local_times = (start_time + ticks + ist_offset).astype('datetime64[s]')
+    clock_times = np.datetime_as_string(local_times, unit='m')  # YYYY-MM-DDTHH:MM
+    labels = [f"{int(tick)}\n{clock[-5:]}" for tick, clock in zip(ticks, clock_times)]
     ax.set_xticklabels(labels, rotation=45, ha='right', fontsize=8)
 
+# Persistent figure: axes, labels, legend and annotation artists are built once
+# at import and generate_plot only updates their data on each frame.
+fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), dpi=96, gridspec_kw={'height_ratios': [1, 1], 'hspace': 0.3}, constrained_layout=False)
+fig.patch.set_facecolor('#f5f5f5')
+plt.subplots_adjust(top=0.92, bottom=0.2, hspace=0.3, left=0.1, right=0.9)
+png_buffer = io.BytesIO()
+
+# Velocity vs Time
+h_line, = ax1.plot([], [], color='#1f77b4', linewidth=1, label='H Vel (mm/s)')
+v_line, = ax1.plot([], [], color='#ff7f0e', linewidth=1, label='V Vel (mm/s)')
+a_line, = ax1.plot([], [], color='#2ca02c', linewidth=1, label='A Vel (mm/s)')
+slider_line = ax1.axvline(0, color='gray', linestyle='--', linewidth=1, alpha=0.7, visible=False)
+slider_text = ax1.text(0, 25, '', fontsize=9, bbox=dict(facecolor='#e6f3fa', edgecolor='gray', alpha=0.9), visible=False)
+ax1.set_title("Velocity vs Time", fontsize=12, weight='bold', pad=10)
+ax1.set_xlabel("Time", fontsize=10)
+ax1.set_ylabel("Velocity (mm/s)", fontsize=10)
+ax1.set_ylim(0, 25)
+ax1.legend(loc='upper left', bbox_to_anchor=(1.02, 1), borderaxespad=0, framealpha=0.8, fontsize=9)
+ax1.grid(True, linestyle='--', alpha=0.5, color='gray')
+ax1.set_facecolor('#fafafa')
+
+# Velocity vs Frequency
+total_y_range = 25
+section_height = total_y_range / 3
+h_base = 0
+v_base = section_height
+a_base = 2 * section_height
+h_stems = ax2.add_collection(LineCollection([], colors='#1f77b4', linewidths=0.5), autolim=False)
+v_stems = ax2.add_collection(LineCollection([], colors='#ff7f0e', linewidths=0.5), autolim=False)
+a_stems = ax2.add_collection(LineCollection([], colors='#2ca02c', linewidths=0.5), autolim=False)
+freq_line = ax2.axvline(0.01, color='gray', linestyle='--', linewidth=1, alpha=0.7, visible=False)
+freq_text = ax2.text(0.01, total_y_range/2, '', fontsize=9, bbox=dict(facecolor='#e6f3fa', edgecolor='gray', alpha=0.9), visible=False)
+ax2.set_title("Velocity vs Frequency (Real Frequency)", fontsize=12, weight='bold', pad=10)
+ax2.set_xlabel("Frequency (Hz)", fontsize=10)
+ax2.set_ylabel("Velocity (mm/s)", fontsize=10)
+ax2.set_xscale('log')
+ax2.set_xlim(0.01, 10)
+ax2.set_ylim(0, total_y_range)
+ax2.set_yticks([h_base, h_base + section_height/2, h_base + section_height,
+                v_base, v_base + section_height/2, v_base + section_height,
+                a_base, a_base + section_height/2, a_base + section_height])
+ax2.set_yticklabels(['0', '4', f'{section_height:.1f}', '0', f'{section_height/2:.1f}', f'{section_height:.1f}', '0', f'{section_height/2:.1f}', f'{section_height:.1f}'])
+ax2.xaxis.set_major_formatter(ticker.ScalarFormatter())
+ax2.xaxis.set_major_locator(ticker.LogLocator(base=10.0, numticks=10))
+ax2.text(-0.1, h_base + section_height/2, "H Vel (mm/s)", rotation=90, va='center', fontsize=9, transform=ax2.get_yaxis_transform())
+ax2.text(-0.1, v_base + section_height/2, "V Vel (mm/s)", rotation=90, va='center', fontsize=9, transform=ax2.get_yaxis_transform())
+ax2.text(-0.1, a_base + section_height/2, "A Vel (mm/s)", rotation=90, va='center', fontsize=9, transform=ax2.get_yaxis_transform())
+ax2.grid(True, linestyle='--', alpha=0.5, color='gray')
+ax2.set_facecolor('#fafafa')
+
+# Lay out once against representative time ticks instead of on every frame
+ax1.set_xlim(0, time_window)
+ax1.set_xticks(np.arange(0, time_window + 60, 60))
+update_xticks_with_military_time(ax1, np.arange(0, time_window + 60, 60), start_time)
+fig.tight_layout()
+
+# Vertical stems from base to base + velocity at each frequency, as (N, 2, 2) segments
+def stem_segments(freqs, vels, base):
+    bottoms = np.column_stack([freqs, np.full_like(freqs, base)])
+    tops = np.column_stack([freqs, base + vels])
+    return np.stack([bottoms, tops], axis=1)
+
 def generate_plot():
-    global time_values, h_vel_values, v_vel_values, a_vel_values
-    global h_freq_values, v_freq_values, a_freq_values
-    global all_time_values, all_h_vel_values, all_v_vel_values, all_a_vel_values
-    global window_start_time
+    global window_start_time, window_data
+
+    current_time = time.time() - start_time
+    if window_start_time is None or (is_scrolling and not is_month_active and not is_paused):
+        window_start_time = max(0, current_time - time_window)
+    window_start = window_start_time
+    window_end = window_start + time_window
+
+    if is_month_active and selected_month is not None:
+        current_year = datetime.datetime.now().year
+        start_date = datetime.datetime(current_year, selected_month, 1)
+        end_date = (start_date + datetime.timedelta(days=31)).replace(day=1, year=current_year) - datetime.timedelta(days=1)
+        window_start = to_epoch(start_date) - start_time
+        window_end = to_epoch(end_date) - start_time
 
     if not is_paused:
-        current_time = time.time() - start_time
-        data = fetch_latest_data()
+        data = fetch_window_data(window_start, window_end)
         
         if data[0] is not None:
             if is_month_active:
                 times, h_vels, v_vels, a_vels = data
-                if times:
-                    logger.info("Updating with month data...")
-                    time_values.clear()
-                    h_vel_values.clear()
-                    v_vel_values.clear()
-                    a_vel_values.clear()
-                    h_freq_values.clear()
-                    v_freq_values.clear()
-                    a_freq_values.clear()
-                    all_time_values.clear()
-                    all_h_vel_values.clear()
-                    all_v_vel_values.clear()
-                    all_a_vel_values.clear()
-                    
-                    for t, h, v, a in zip(times, h_vels, v_vels, a_vels):
-                        time_values.append(t)
-                        h_vel_values.append(h)
-                        v_vel_values.append(v)
-                        a_vel_values.append(a)
-                        h_freq = compute_real_frequency(time_values, h_vel_values)
-                        v_freq = compute_real_frequency(time_values, v_vel_values)
-                        a_freq = compute_real_frequency(time_values, a_vel_values)
-                        h_freq_values.append(h_freq)
-                        v_freq_values.append(v_freq)
-                        a_freq_values.append(a_freq)
-                        all_time_values.append(t)
-                        all_h_vel_values.append(h)
-                        all_v_vel_values.append(v)
-                        all_a_vel_values.append(a)
+                logger.info("Updating with month data...")
+                times = np.array([to_epoch(t) - start_time if isinstance(t, datetime.datetime) else t for t in times], dtype=np.float64)
+                data = (times, np.asarray(h_vels), np.asarray(v_vels), np.asarray(a_vels))
+                h_freqs = compute_frequency_series(times, data[1])
+                v_freqs = compute_frequency_series(times, data[2])
+                a_freqs = compute_frequency_series(times, data[3])
+                samples.load(*data, h_freqs, v_freqs, a_freqs)
             else:
-                time_val, h_vel, v_vel, a_vel = data
-                time_values.append(time_val)
-                h_vel_values.append(h_vel)
-                v_vel_values.append(v_vel)
-                a_vel_values.append(a_vel)
-                h_freq = compute_real_frequency(time_values, h_vel_values)
-                v_freq = compute_real_frequency(time_values, v_vel_values)
-                a_freq = compute_real_frequency(time_values, a_vel_values)
-                h_freq_values.append(h_freq)
-                v_freq_values.append(v_freq)
-                a_freq_values.append(a_freq)
-                all_time_values.append(time_val)
-                all_h_vel_values.append(h_vel)
-                all_v_vel_values.append(v_vel)
-                all_a_vel_values.append(a_vel)
+                times, h_vels, v_vels, a_vels = data
+                samples.append(times[-1], h_vels[-1], v_vels[-1], a_vels[-1])
+                window = samples.view()
+                h_freq = compute_real_frequency(window[RingBuffer.T], window[RingBuffer.H])
+                v_freq = compute_real_frequency(window[RingBuffer.T], window[RingBuffer.V])
+                a_freq = compute_real_frequency(window[RingBuffer.T], window[RingBuffer.A])
+                samples.set_frequencies(h_freq, v_freq, a_freq)
+            window_data = data
+        else:
+            window_data = (np.empty(0), np.empty(0), np.empty(0), np.empty(0))
 
         if not is_month_active:
-            while time_values and current_time - time_values[0] > time_window:
-                time_values.pop(0)
-                h_vel_values.pop(0)
-                v_vel_values.pop(0)
-                a_vel_values.pop(0)
-                h_freq_values.pop(0)
-                v_freq_values.pop(0)
-                a_freq_values.pop(0)
-
-    if window_start_time is None:
-        window_start_time = max(0, current_time - time_window)
-    if is_scrolling and not is_month_active:
-        window_start_time = max(0, current_time - time_window)
-    window_start = window_start_time
-    window_end = window_start + time_window
+            samples.drop_before(current_time - time_window)
 
-    if is_month_active and selected_month is not None:
-        current_year = datetime.datetime.now().year
-        start_date = datetime.datetime(current_year, selected_month, 1)
-        end_date = (start_date + datetime.timedelta(days=31)).replace(day=1, year=current_year) - datetime.timedelta(days=1)
-        window_start = pd.Timestamp(start_date).timestamp() - start_time
-        window_end = pd.Timestamp(end_date).timestamp() - start_time
-
-    display_times = []
-    display_h_vel = []
-    display_v_vel = []
-    display_a_vel = []
-    for t, h, v, a in zip(all_time_values, all_h_vel_values, all_v_vel_values, all_a_vel_values):
-        t_num = t if not isinstance(t, datetime.datetime) else pd.Timestamp(t).timestamp() - start_time
-        if window_start <= t_num <= window_end:
-            display_times.append(t_num)
-            display_h_vel.append(h)
-            display_v_vel.append(v)
-            display_a_vel.append(a)
-
-    # Create subplots
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), gridspec_kw={'height_ratios': [1, 1], 'hspace': 0.3})
-    fig.patch.set_facecolor('#f5f5f5')
-    plt.subplots_adjust(top=0.92, bottom=0.2, hspace=0.3, left=0.1, right=0.9)
+    display_times, display_h_vel, display_v_vel, display_a_vel = window_data
 
     # Velocity vs Time
-    if len(display_times) > 3:
-        data = list(zip(display_times, display_h_vel, display_v_vel, display_a_vel))
-        data.sort(key=lambda x: x[0])
-        seen_times = {}
-        for t, h, v, a in data:
-            seen_times[t] = (h, v, a)
-        display_times = list(seen_times.keys())
-        display_h_vel = [x[0] for x in seen_times.values()]
-        display_v_vel = [x[1] for x in seen_times.values()]
-        display_a_vel = [x[2] for x in seen_times.values()]
-        display_times_np = np.array(display_times)
-        display_h_vel_np = np.array(display_h_vel)
-        display_v_vel_np = np.array(display_v_vel)
-        display_a_vel_np = np.array(display_a_vel)
+    # Rows come back ORDER BY sample, so times are already sorted; only repeated
+    # timestamps need collapsing (keeping the last row) before spline fitting.
+    steps = np.diff(display_times)
+    assert np.all(steps >= 0), "window times must be non-decreasing"
+    if np.any(steps == 0):
+        last = len(display_times) - 1 - np.unique(display_times[::-1], return_index=True)[1]
+        display_times, display_h_vel, display_v_vel, display_a_vel = (
+            display_times[last], display_h_vel[last], display_v_vel[last], display_a_vel[last])
+    if smoothing_enabled and 3 < len(display_times) < smoothing_max_points:
         num_points = len(display_times) * 5
-        smooth_times = np.linspace(display_times_np.min(), display_times_np.max(), num_points)
-        h_spline = make_interp_spline(display_times_np, display_h_vel_np, k=3)
-        v_spline = make_interp_spline(display_times_np, display_v_vel_np, k=3)
-        a_spline = make_interp_spline(display_times_np, display_a_vel_np, k=3)
+        smooth_times = np.linspace(display_times[0], display_times[-1], num_points)
+        h_spline = make_interp_spline(display_times, display_h_vel, k=3)
+        v_spline = make_interp_spline(display_times, display_v_vel, k=3)
+        a_spline = make_interp_spline(display_times, display_a_vel, k=3)
         smooth_h_vel = h_spline(smooth_times)
         smooth_v_vel = v_spline(smooth_times)
         smooth_a_vel = a_spline(smooth_times)
@@ -334,88 +460,103 @@ def generate_plot():
         v_y = smooth_v_vel
         a_y = smooth_a_vel
     else:
-        x_time = display_times
-        h_y = display_h_vel
-        v_y = display_v_vel
-        a_y = display_a_vel
-
-    if show_h:
-        ax1.plot(x_time, h_y, color='#1f77b4', linewidth=1, label='H Vel (mm/s)')
-    if show_v:
-        ax1.plot(x_time, v_y, color='#ff7f0e', linewidth=1, label='V Vel (mm/s)')
-    if show_a:
-        ax1.plot(x_time, a_y, color='#2ca02c', linewidth=1, label='A Vel (mm/s)')
+        index = np.linspace(0, len(display_times) - 1, min(len(display_times), max_plot_points)).astype(int)
+        x_time = display_times[index]
+        h_y = display_h_vel[index]
+        v_y = display_v_vel[index]
+        a_y = display_a_vel[index]
+
+    h_line.set_data(x_time, h_y)
+    v_line.set_data(x_time, v_y)
+    a_line.set_data(x_time, a_y)
+    h_line.set_visible(show_h)
+    v_line.set_visible(show_v)
+    a_line.set_visible(show_a)
 
     slider_x = window_start + (window_end - window_start) / 2
-    t_vals = [t if not isinstance(t, datetime.datetime) else pd.Timestamp(t).timestamp() - start_time for t in all_time_values]
-    if t_vals:
-        index = min(range(len(t_vals)), key=lambda i: abs(t_vals[i] - slider_x), default=0)
-        time_str = f"{t_vals[index]:.2f}s"
-        slider_annot_text = f"Time: {time_str}\nH Vel: {all_h_vel_values[index]:.2f} mm/s\nV Vel: {all_v_vel_values[index]:.2f} mm/s\nA Vel: {all_a_vel_values[index]:.2f} mm/s"
-        ax1.axvline(slider_x, color='gray', linestyle='--', linewidth=1, alpha=0.7)
-        ax1.text(slider_x, 25, slider_annot_text, fontsize=9, bbox=dict(facecolor='#e6f3fa', edgecolor='gray', alpha=0.9))
-    ax1.set_title("Velocity vs Time", fontsize=12, weight='bold', pad=10)
-    ax1.set_xlabel("Time", fontsize=10)
-    ax1.set_ylabel("Velocity (mm/s)", fontsize=10)
-    ax1.set_ylim(0, 25)
+    if len(display_times):
+        index = int(np.argmin(np.abs(np.asarray(display_times) - slider_x)))
+        time_str = f"{display_times[index]:.2f}s"
+        slider_annot_text = f"Time: {time_str}\nH Vel: {display_h_vel[index]:.2f} mm/s\nV Vel: {display_v_vel[index]:.2f} mm/s\nA Vel: {display_a_vel[index]:.2f} mm/s"
+        slider_line.set_xdata([slider_x, slider_x])
+        slider_text.set_position((slider_x, 25))
+        slider_text.set_text(slider_annot_text)
+    slider_line.set_visible(len(display_times) > 0)
+    slider_text.set_visible(len(display_times) > 0)
     ax1.set_xlim(window_start, window_end)
     ax1.set_xticks(np.arange(max(0, window_start), window_end + 60, 60))
     update_xticks_with_military_time(ax1, np.arange(max(0, window_start), window_end + 60, 60), start_time)
-    ax1.legend(loc='upper left', bbox_to_anchor=(1.02, 1), borderaxespad=0, framealpha=0.8, fontsize=9)
-    ax1.grid(True, linestyle='--', alpha=0.5, color='gray')
-    ax1.set_facecolor('#fafafa')
 
     # Velocity vs Frequency
-    total_y_range = 25
-    section_height = total_y_range / 3
-    h_base = 0
-    v_base = section_height
-    a_base = 2 * section_height
-    if show_h and h_freq_values:
-        for freq, v in zip(h_freq_values, h_vel_values):
-            ax2.plot([freq, freq], [h_base, h_base + v], color='#1f77b4', linewidth=0.5)
-    if show_v and v_freq_values:
-        for freq, v in zip(v_freq_values, v_vel_values):
-            ax2.plot([freq, freq], [v_base, v_base + v], color='#ff7f0e', linewidth=0.5)
-    if show_a and a_freq_values:
-        for freq, v in zip(a_freq_values, a_vel_values):
-            ax2.plot([freq, freq], [a_base, a_base + v], color='#2ca02c', linewidth=0.5)
-    avg_freq = (h_freq_values[-1] + v_freq_values[-1] + a_freq_values[-1]) / 3 if h_freq_values else 0.01
-    if h_freq_values:
-        avg_freqs = [(f_h + f_v + f_a) / 3 for f_h, f_v, f_a in zip(h_freq_values, v_freq_values, a_freq_values)]
-        index = min(range(len(avg_freqs)), key=lambda i: abs(avg_freqs[i] - avg_freq), default=0)
-        if (0 <= index < len(h_vel_values) and 
-            0 <= index < len(v_vel_values) and 
-            0 <= index < len(a_vel_values)):
-            freq_annot_text = f"Freq: {avg_freqs[index]:.2f} Hz\nH Vel: {h_vel_values[index]:.2f} mm/s\nV Vel: {v_vel_values[index]:.2f} mm/s\nA Vel: {a_vel_values[index]:.2f} mm/s"
-            ax2.axvline(avg_freq, color='gray', linestyle='--', linewidth=1, alpha=0.7)
-            ax2.text(avg_freq, total_y_range/2, freq_annot_text, fontsize=9, bbox=dict(facecolor='#e6f3fa', edgecolor='gray', alpha=0.9))
-    ax2.set_title("Velocity vs Frequency (Real Frequency)", fontsize=12, weight='bold', pad=10)
-    ax2.set_xlabel("Frequency (Hz)", fontsize=10)
-    ax2.set_ylabel("Velocity (mm/s)", fontsize=10)
-    ax2.set_xscale('log')
-    ax2.set_xlim(0.01, 10)
-    ax2.set_ylim(0, total_y_range)
-    ax2.set_yticks([h_base, h_base + section_height/2, h_base + section_height,
-                    v_base, v_base + section_height/2, v_base + section_height,
-                    a_base, a_base + section_height/2, a_base + section_height])
-    ax2.set_yticklabels(['0', '4', f'{section_height:.1f}', '0', f'{section_height/2:.1f}', f'{section_height:.1f}', '0', f'{section_height/2:.1f}', f'{section_height:.1f}'])
-    ax2.xaxis.set_major_formatter(ticker.ScalarFormatter())
-    ax2.xaxis.set_major_locator(ticker.LogLocator(base=10.0, numticks=10))
-    ax2.text(-0.1, h_base + section_height/2, "H Vel (mm/s)", rotation=90, va='center', fontsize=9, transform=ax2.get_yaxis_transform())
-    ax2.text(-0.1, v_base + section_height/2, "V Vel (mm/s)", rotation=90, va='center', fontsize=9, transform=ax2.get_yaxis_transform())
-    ax2.text(-0.1, a_base + section_height/2, "A Vel (mm/s)", rotation=90, va='center', fontsize=9, transform=ax2.get_yaxis_transform())
-    ax2.grid(True, linestyle='--', alpha=0.5, color='gray')
-    ax2.set_facecolor('#fafafa')
-
-    # Convert plot to base64
-    buf = io.BytesIO()
-    plt.tight_layout()
-    plt.savefig(buf, format='png', dpi=120)
-    plt.close(fig)
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-    return img_base64
+    window = samples.view()
+    time_values, h_vel_values, v_vel_values, a_vel_values = window[:4]
+    h_freq_values, v_freq_values, a_freq_values = window[4:]
+    h_stems.set_segments(stem_segments(h_freq_values, h_vel_values, h_base))
+    v_stems.set_segments(stem_segments(v_freq_values, v_vel_values, v_base))
+    a_stems.set_segments(stem_segments(a_freq_values, a_vel_values, a_base))
+    h_stems.set_visible(show_h)
+    v_stems.set_visible(show_v)
+    a_stems.set_visible(show_a)
+    avg_freq = (h_freq_values[-1] + v_freq_values[-1] + a_freq_values[-1]) / 3 if len(samples) else 0.01
+    if len(samples):
+        avg_freqs = (h_freq_values + v_freq_values + a_freq_values) / 3
+        index = int(np.argmin(np.abs(avg_freqs - avg_freq)))
+        freq_annot_text = f"Freq: {avg_freqs[index]:.2f} Hz\nH Vel: {h_vel_values[index]:.2f} mm/s\nV Vel: {v_vel_values[index]:.2f} mm/s\nA Vel: {a_vel_values[index]:.2f} mm/s"
+        freq_line.set_xdata([avg_freq, avg_freq])
+        freq_text.set_position((avg_freq, total_y_range/2))
+        freq_text.set_text(freq_annot_text)
+    freq_line.set_visible(len(samples) > 0)
+    freq_text.set_visible(len(samples) > 0)
+
+    # Render plot to PNG bytes
+    png_buffer.seek(0)
+    png_buffer.truncate()
+    fig.savefig(png_buffer, format='png', dpi=96)
+    return png_buffer.getvalue()
+
+# Everything a frame depends on: the newest sample for the sensor plus the view
+# state. Scrolling windows are keyed to the whole second they start on.
+def frame_key():
+    if is_scrolling and not is_month_active and not is_paused:
+        window_key = max(0, time.time() - start_time - time_window) // 1
+    else:
+        window_key = window_start_time
+    max_sample = query_rows("SELECT MAX(sample) FROM samples WHERE sensor_id = %s", (current_sensor_id,))[0][0]
+    return (max_sample, current_sensor_id, is_month_active, selected_month, is_paused, window_key)
+
+# Returns the frame and whether it was redrawn; unchanged keys reuse the last PNG
+def render_frame():
+    global last_frame, last_frame_key
+    try:
+        key = frame_key()
+    except Exception as e:
+        logger.error(f"Error checking for new data: {e}")
+        key = None
+    if key is not None and key == last_frame_key:
+        return last_frame, False
+    last_frame = generate_plot()
+    last_frame_key = key
+    return last_frame, True
+
+# Background renderer. Requests from any number of clients collapse into one
+# frame_requested event, so at most one frame is drawn per stream_interval and
+# nothing is drawn while nobody is watching.
+def render_loop():
+    global latest_frame, frame_version
+    while True:
+        frame_requested.wait()
+        frame_requested.clear()
+        try:
+            png, changed = render_frame()
+            if changed:
+                with frame_ready:
+                    latest_frame = png
+                    frame_version += 1
+                    frame_ready.notify_all()
+        except Exception as e:
+            logger.error(f"Error rendering frame: {e}")
+        time.sleep(stream_interval)
+threading.Thread(target=render_loop, daemon=True).start()
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -423,18 +564,61 @@ def index():
     if request.method == 'POST':
         if 'pause' in request.form:
             is_paused = not is_paused
-    img_base64 = generate_plot()
-    return render_template_string(HTML_TEMPLATE, img_data=img_base64, is_paused=is_paused)
+    frame_requested.set()
+    response = make_response(render_template_string(HTML_TEMPLATE, frame_version=frame_version, is_paused=is_paused))
+    response.add_etag()
+    return response.make_conditional(request)
+
+# The PNG itself is served on its own URL so the page stays small and the
+# browser can revalidate the image with If-None-Match instead of re-downloading it.
+@app.route('/plot.png')
+def plot_png():
+    frame_requested.set()
+    with frame_ready:
+        frame_ready.wait_for(lambda: latest_frame is not None, timeout=10)
+        png = latest_frame
+    if png is None:
+        return Response("Plot not ready", status=503, mimetype='text/plain')
+    response = Response(png, mimetype='image/png', headers={'Cache-Control': 'no-cache'})
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/stream')
+def stream():
+    def frames():
+        sent_version = 0  # version 0 means nothing has been rendered yet
+        while True:
+            # Pause is shared by every viewer: keep the other viewers' streams
+            # open (closing makes EventSource reconnect every few seconds) but
+            # stop asking for frames until someone resumes
+            if is_paused:
+                time.sleep(stream_interval * 4)
+                yield ": keepalive\n\n"
+                continue
+            frame_requested.set()
+            with frame_ready:
+                frame_ready.wait_for(lambda: frame_version != sent_version, timeout=stream_interval * 4)
+                version, png = frame_version, latest_frame
+            if version != sent_version and png is not None:
+                sent_version = version
+                yield f"data: {version}\n\n"
+            else:
+                # SSE comment as a heartbeat, so a client that has gone away fails
+                # the write and ends this generator instead of polling forever
+                yield ": keepalive\n\n"
+    return Response(frames(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 if __name__ == '__main__':
     try:
-        app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=False)
+        if '--migrate' in sys.argv[1:]:
+            ensure_indexes()
+        else:
+            app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=False, threaded=True)
     except KeyboardInterrupt:
         logger.info("Script terminated by user.")
     finally:
         try:
-            cursor.close()
-            conn.close()
-            logger.info("Database connection closed.")
+            db_pool.closeall()
+            logger.info("Database connections closed.")
         except Exception as e:
             logger.error(f"Error closing database connection: {e}")
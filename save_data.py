@@ -1,11 +1,33 @@
-import websocket
-import json
+import asyncio
+import socket
+import websockets
+try:
+    import uvloop
+except ImportError:  # stock asyncio event loop when uvloop is unavailable
+    uvloop = None
+try:
+    from orjson import loads, JSONDecodeError
+except ImportError:  # stdlib parser when orjson is unavailable
+    from json import loads, JSONDecodeError
 import os
-from psycopg2 import connect, Error
+import io
+from psycopg2 import connect, Error, InterfaceError
 import numpy as np
+try:
+    from numba import njit
+except ImportError:  # run the kernel as plain NumPy when numba is unavailable
+    def njit(*args, **kwargs):
+        return lambda func: func
 from datetime import datetime
 import threading
+import queue
 import time
+import logging
+
+# Set up logging; per-message detail is logged at DEBUG, so it costs nothing
+# unless LOGLEVEL=DEBUG is set
+logging.basicConfig(level=os.getenv("LOGLEVEL", "INFO").upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 # Function to establish database connection with retry
 def get_db_connection():
@@ -17,32 +39,26 @@ def get_db_connection():
             if not db_url:
                 raise ValueError("DATABASE_URL environment variable not set")
             conn = connect(db_url)
+            # Every statement is its own transaction, so a batch's COPY commits
+            # without a separate COMMIT round-trip
+            conn.autocommit = True
             cursor = conn.cursor()
-            print("Connected to PostgreSQL successfully!")
+            # Don't wait for the WAL flush on commit. A crash can lose the last
+            # few hundred milliseconds of committed batches, which is acceptable
+            # for telemetry, but the database itself stays consistent.
+            cursor.execute("SET synchronous_commit = off")
+            logger.info("Connected to PostgreSQL successfully!")
             return conn, cursor
         except Error as e:
-            print(f"Error connecting to PostgreSQL (attempt {retry_count + 1}/{max_retries}): {e}")
+            logger.error("Error connecting to PostgreSQL (attempt %d/%d): %s", retry_count + 1, max_retries, e)
             retry_count += 1
             time.sleep(2 ** retry_count)  # Exponential backoff
     raise Exception("Failed to connect to PostgreSQL after multiple attempts")
 
-# Initial connection
-try:
-    conn, cursor = get_db_connection()
-    
-    # Get the last sample number
-    cursor.execute("SELECT COALESCE(MAX(sample), 0) FROM samples")
-    last_sample = cursor.fetchone()[0]
-    sample_count = last_sample + 1
-    print(f"Starting from sample {sample_count}")
-except Exception as e:
-    print(f"Critical error: {e}")
-    exit()
-
 # Get sensor ID
 sensor_id = int(os.getenv("SENSOR_ID", "1"))
 if sensor_id not in [1, 2, 3, 4, 5]:
-    print("Invalid sensor ID from environment. Using sensor ID 1.")
+    logger.warning("Invalid sensor ID from environment. Using sensor ID 1.")
     sensor_id = 1
 
 # Calculation settings
@@ -50,176 +66,336 @@ VEL_WINDOW = 10
 DT = 0.015
 HPF_ALPHA = 0.84
 LPF_BETA = 0.32
+ONE_MINUS_LPF_BETA = 1 - LPF_BETA
+HALF_DT = DT * 0.5
 RESET_INTERVAL = 20
 ACCEL_LIMIT = 49050
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 5  # seconds; partial batches are flushed after this so rows don't sit idle
+SAMPLES_PER_DAY = int(86400 / DT)
 
-# Buffers and state
-vel_buffer_x = [0] * VEL_WINDOW
-vel_buffer_y = [0] * VEL_WINDOW
-vel_buffer_z = [0] * VEL_WINDOW
-disp_buffer_x = [0] * VEL_WINDOW
-disp_buffer_y = [0] * VEL_WINDOW
-disp_buffer_z = [0] * VEL_WINDOW
-vel_index = 0
-vel_x, vel_y, vel_z = 0, 0, 0
-disp_x, disp_y, disp_z = 0, 0, 0
-prev_acc_x, prev_acc_y, prev_acc_z = 0, 0, 0
-prev_vel_x, prev_vel_y, prev_vel_z = 0, 0, 0
-prev_hpf_x, prev_hpf_y, prev_hpf_z = 0, 0, 0
-prev_lpf_x, prev_lpf_y, prev_lpf_z = 0, 0, 0
-prev_input_x, prev_input_y, prev_input_z = 0, 0, 0
-sample_counter = 0
-all_data = []
-
-# WebSocket functions
-def on_message(ws, message):
-    global vel_index, vel_x, vel_y, vel_z, disp_x, disp_y, disp_z
-    global prev_acc_x, prev_acc_y, prev_acc_z, prev_vel_x, prev_vel_y, prev_vel_z
-    global prev_hpf_x, prev_hpf_y, prev_hpf_z, prev_lpf_x, prev_lpf_y, prev_lpf_z
-    global prev_input_x, prev_input_y, prev_input_z, sample_counter, sample_count
-    print(f"Received Raw: {message}")
+# Batches are bulk-loaded with COPY, which skips the per-statement parse/plan
+# work of INSERT and streams the rows as CSV
+COPY_SQL = """
+    COPY samples (sample, x, y, z, h_vib, v_vib, a_vib, h_vel, v_vel, a_vel, h_disp, v_disp, a_disp, sensor_id)
+    FROM STDIN WITH (FORMAT CSV)
+"""
+
+# Rows arrive as float64 arrays; sample and sensor_id go out as integers and
+# the rest with enough digits to round-trip exactly
+ROW_FORMAT = ['%d'] + ['%.17g'] * 12 + ['%d']
+
+def copy_rows(cursor, rows):
+    buf = io.StringIO()
+    np.savetxt(buf, rows, fmt=ROW_FORMAT, delimiter=',')
+    buf.seek(0)
+    cursor.copy_expert(COPY_SQL, buf)
+
+# Optional TimescaleDB setup (TIMESCALE=1): turn samples into a hypertable chunked
+# on the sample counter and compress week-old chunks per sensor. Safe to rerun.
+def setup_timescale(cursor):
     try:
-        if message in ["Authenticated", "Authentication failed", "Resetting sensor..."]:
-            print(f"Skipping message: {message}")
-            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS timescaledb")
+        cursor.execute("""
+            SELECT create_hypertable('samples', 'sample', chunk_time_interval => %s,
+                                     if_not_exists => TRUE, migrate_data => TRUE)
+        """, (SAMPLES_PER_DAY,))
+        # Integer-partitioned hypertables need a "now" for age-based policies
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION samples_now() RETURNS bigint
+            LANGUAGE SQL STABLE AS $$ SELECT COALESCE(MAX(sample), 0)::bigint FROM samples $$
+        """)
+        cursor.execute("SELECT set_integer_now_func('samples', 'samples_now', replace_if_exists => TRUE)")
+        cursor.execute("""
+            ALTER TABLE samples SET (timescaledb.compress,
+                                     timescaledb.compress_segmentby = 'sensor_id',
+                                     timescaledb.compress_orderby = 'sample')
+        """)
+        cursor.execute("SELECT add_compression_policy('samples', compress_after => %s, if_not_exists => TRUE)",
+                       (7 * SAMPLES_PER_DAY,))
+        logger.info("TimescaleDB hypertable and compression policy are in place.")
+    except Error as e:
+        logger.error("TimescaleDB setup failed: %s", e)
+
+# Buffers and state. Filter/integrator state is one (9, 3) array with a row per
+# quantity and a column per axis (x, y, z); RMS windows are (VEL_WINDOW, 3) and
+# their running sums of squares live in the VEL_SQ_SUM/DISP_SQ_SUM rows.
+# Kernel counters are an int64 array: position in the RMS windows and samples
+# since the last integrator reset. All mutable ingest state hangs off one
+# IngestState object so the message handler reaches it through a single name.
+PREV_HPF, PREV_LPF, PREV_INPUT, PREV_ACC, PREV_VEL, VEL, DISP, VEL_SQ_SUM, DISP_SQ_SUM = range(9)
+VEL_INDEX, SAMPLE_COUNTER = range(2)
+
+class IngestState:
+    def __init__(self):
+        self.state = np.zeros((9, 3))
+        self.vel_buffer = np.zeros((VEL_WINDOW, 3))
+        self.disp_buffer = np.zeros((VEL_WINDOW, 3))
+        self.counters = np.zeros(2, dtype=np.int64)
+        # Pending rows are written straight into a preallocated (BATCH_SIZE, 14)
+        # buffer in COPY column order instead of building a tuple per sample
+        self.row_buf = np.empty((BATCH_SIZE, 14))
+        self.row_buf[:, 13] = sensor_id
+        self.row_count = 0
+        # Samples are numbered relative to the last stored sample, which is only
+        # known once the database writer has connected; it adds that offset.
+        self.sample_count = 1
+        self.last_flush = time.monotonic()
 
-        data = json.loads(message)
-        print(f"Parsed Data: {data}")
-
-        if 'a' in data and 'vib' in data and isinstance(data['a'], list) and len(data['a']) == 3 and isinstance(data['vib'], list) and len(data['vib']) == 3:
-            sample_count += 1
-            sample_counter += 1
-            x = float(data['a'][0])
-            y = float(data['a'][1])
-            z = float(data['a'][2])
-            h_vib = float(data['vib'][0])
-            v_vib = float(data['vib'][1])
-            a_vib = float(data['vib'][2])
-
-            if abs(x) > ACCEL_LIMIT or abs(y) > ACCEL_LIMIT or abs(z) > ACCEL_LIMIT:
-                print(f"Skipping outlier: x={x:.2f}, y={y:.2f}, z={z:.2f}")
+ingest = IngestState()
+
+# Owns the database connection and writes batches from its own thread, so the
+# WebSocket thread never waits on Postgres. Batches queue up in a bounded ring
+# (oldest dropped first) while the database is unreachable; the writer keeps
+# reconnecting with backoff and replays a batch whose connection was lost.
+MAX_PENDING_BATCHES = 256
+RECONNECT_DELAY = 30
+CLOSE_TIMEOUT = 30
+
+class DBWriter:
+    def __init__(self):
+        self.conn = None
+        self.cursor = None
+        self.sample_base = None
+        self.queue = queue.Queue(maxsize=MAX_PENDING_BATCHES)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, rows):
+        while True:
+            try:
+                self.queue.put_nowait(rows)
                 return
+            except queue.Full:
+                try:
+                    dropped = self.queue.get_nowait()
+                    logger.warning("Write backlog full; dropped %d oldest rows", len(dropped))
+                except queue.Empty:
+                    pass
+
+    # Flush what is queued and stop, giving up after CLOSE_TIMEOUT seconds if the
+    # database is still unreachable. The stop sentinel is queued the same
+    # drop-oldest way as a batch, so a full backlog can't block shutdown.
+    def close(self):
+        self.write(None)
+        self.thread.join(CLOSE_TIMEOUT)
+        if not self.thread.is_alive():
+            self.disconnect()
+
+    def connect(self):
+        while self.conn is None:
+            try:
+                self.conn, self.cursor = get_db_connection()
+                if self.sample_base is None:
+                    self.cursor.execute("SELECT COALESCE(MAX(sample), 0) FROM samples")
+                    self.sample_base = self.cursor.fetchone()[0]
+                    logger.info("Starting from sample %d", self.sample_base + ingest.sample_count)
+                    if os.getenv("TIMESCALE") == "1":
+                        setup_timescale(self.cursor)
+            except Exception as e:
+                logger.error("Database unavailable, retrying in %d s: %s", RECONNECT_DELAY, e)
+                self.disconnect()
+                time.sleep(RECONNECT_DELAY)
 
-            hpf_x = HPF_ALPHA * (prev_hpf_x + x - prev_input_x)
-            hpf_y = HPF_ALPHA * (prev_hpf_y + y - prev_input_y)
-            hpf_z = HPF_ALPHA * (prev_hpf_z + z - prev_input_z)
-            lpf_x = LPF_BETA * hpf_x + (1 - LPF_BETA) * prev_lpf_x
-            lpf_y = LPF_BETA * hpf_y + (1 - LPF_BETA) * prev_lpf_y
-            lpf_z = LPF_BETA * hpf_z + (1 - LPF_BETA) * prev_lpf_z
-
-            prev_hpf_x = hpf_x
-            prev_hpf_y = hpf_y
-            prev_hpf_z = hpf_z
-            prev_lpf_x = lpf_x
-            prev_lpf_y = lpf_y
-            prev_lpf_z = lpf_z
-            prev_input_x = x
-            prev_input_y = y
-            prev_input_z = z
-
-            vel_x += ((lpf_x + prev_acc_x) / 2) * DT
-            vel_y += ((lpf_y + prev_acc_y) / 2) * DT
-            vel_z += ((lpf_z + prev_acc_z) / 2) * DT
-            prev_acc_x = lpf_x
-            prev_acc_y = lpf_y
-            prev_acc_z = lpf_z
-
-            disp_x += ((vel_x + prev_vel_x) / 2) * DT
-            disp_y += ((vel_y + prev_vel_y) / 2) * DT
-            disp_z += ((vel_z + prev_vel_z) / 2) * DT
-            prev_vel_x = vel_x
-            prev_vel_y = vel_y
-            prev_vel_z = vel_z
-
-            if sample_counter >= RESET_INTERVAL:
-                vel_x = vel_y = vel_z = 0
-                disp_x = disp_y = disp_z = 0
-                sample_counter = 0
-
-            vel_buffer_x[vel_index] = vel_x
-            vel_buffer_y[vel_index] = vel_y
-            vel_buffer_z[vel_index] = vel_z
-            disp_buffer_x[vel_index] = disp_x
-            disp_buffer_y[vel_index] = disp_y
-            disp_buffer_z[vel_index] = disp_z
-            vel_index = (vel_index + 1) % VEL_WINDOW
-
-            vel_rms_x = np.sqrt(sum(v * v for v in vel_buffer_x) / VEL_WINDOW)
-            vel_rms_y = np.sqrt(sum(v * v for v in vel_buffer_y) / VEL_WINDOW)
-            vel_rms_z = np.sqrt(sum(v * v for v in vel_buffer_z) / VEL_WINDOW)
-            disp_rms_x = np.sqrt(sum(v * v for v in disp_buffer_x) / VEL_WINDOW)
-            disp_rms_y = np.sqrt(sum(v * v for v in disp_buffer_y) / VEL_WINDOW)
-            disp_rms_z = np.sqrt(sum(v * v for v in disp_buffer_z) / VEL_WINDOW)
-
-            vel_rms_h = float(vel_rms_z)  # Horizontal = Z
-            vel_rms_v = float(vel_rms_y)  # Vertical = Y
-            vel_rms_a = float(vel_rms_x)  # Axial = X
-            disp_rms_h = float(disp_rms_z)
-            disp_rms_v = float(disp_rms_y)
-            disp_rms_a = float(disp_rms_x)
-
-            row = (sample_count, x, y, z, h_vib, v_vib, a_vib, vel_rms_h, vel_rms_v, vel_rms_a, disp_rms_h, disp_rms_v, disp_rms_a, sensor_id)
-            all_data.append(row)
-            print(f"Added Data: sample={sample_count}, x={x:.2f}, y={y:.2f}, z={z:.2f}, h_vib={h_vib:.2f}, sensor_id={sensor_id}")
-
-            if len(all_data) >= 10:
+    def disconnect(self):
+        conn, self.conn, self.cursor = self.conn, None, None
+        if conn is not None:
+            try:
+                conn.close()
+                logger.info("Database connection closed.")
+            except Exception as e:
+                logger.error("Failed to close connection: %s", e)
+
+    def run(self):
+        self.connect()
+        while True:
+            rows = self.queue.get()
+            if rows is None:
+                break
+            self.connect()
+            rows[:, 0] += self.sample_base
+            # The COPY is a single autocommitted statement: a lost connection
+            # leaves nothing behind, so the batch is replayed after reconnecting.
+            # Errors raised on a live connection (disk full, statement timeout,
+            # bad data, ...) would just fail again, so those drop the batch.
+            while True:
                 try:
-                    cursor.executemany("""
-                        INSERT INTO samples (sample, x, y, z, h_vib, v_vib, a_vib, h_vel, v_vel, a_vel, h_disp, v_disp, a_disp, sensor_id)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, all_data)
-                    conn.commit()
-                    print(f"✅ Saved {len(all_data)} rows to vibration_data_db")
-                    all_data.clear()
+                    copy_rows(self.cursor, rows)
+                    logger.info("✅ Saved %d rows to vibration_data_db", len(rows))
+                    break
                 except Exception as e:
-                    print(f"Failed to save data: {e}")
-                    conn.rollback()
-                    all_data.clear()
+                    if not isinstance(e, InterfaceError) and not self.conn.closed:
+                        logger.error("Failed to save data: %s", e)
+                        break
+                    logger.error("Lost database connection, replaying batch in %d s: %s", RECONNECT_DELAY, e)
+                    self.disconnect()
+                    time.sleep(RECONNECT_DELAY)
+                    self.connect()
 
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing error: {e}")
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        conn.rollback()
+db_writer = DBWriter()
+
+# Hand the pending rows to the writer
+def flush_rows():
+    ingest.last_flush = time.monotonic()
+    if not ingest.row_count:
+        return
+    db_writer.write(ingest.row_buf[:ingest.row_count].copy())
+    ingest.row_count = 0
+
+# Per-sample DSP kernel: HPF -> LPF -> trapezoidal velocity/displacement
+# integration -> windowed RMS. Updates state and the RMS buffers in place and
+# returns [vel_rms_h, vel_rms_v, vel_rms_a, disp_rms_h, disp_rms_v, disp_rms_a].
+@njit(cache=True, fastmath=True)
+def process_sample(acc, state, vel_buffer, disp_buffer, counters):
+    index = counters[VEL_INDEX]
+    counters[SAMPLE_COUNTER] += 1
+    reset = counters[SAMPLE_COUNTER] >= RESET_INTERVAL
+
+    hpf = HPF_ALPHA * (state[PREV_HPF] + acc - state[PREV_INPUT])
+    lpf = LPF_BETA * hpf + ONE_MINUS_LPF_BETA * state[PREV_LPF]
+    state[PREV_HPF] = hpf
+    state[PREV_LPF] = lpf
+    state[PREV_INPUT] = acc
+
+    state[VEL] += (lpf + state[PREV_ACC]) * HALF_DT
+    state[PREV_ACC] = lpf
 
-def on_error(ws, error):
-    print(f"WebSocket error: {error}")
+    state[DISP] += (state[VEL] + state[PREV_VEL]) * HALF_DT
+    state[PREV_VEL] = state[VEL]
+
+    if reset:
+        state[VEL] = 0
+        state[DISP] = 0
+        counters[SAMPLE_COUNTER] = 0
+
+    # Swap the oldest value out of the running sums of squares. They are
+    # recomputed exactly once per lap of the window so rounding can't accumulate.
+    state[VEL_SQ_SUM] += state[VEL] * state[VEL] - vel_buffer[index] * vel_buffer[index]
+    state[DISP_SQ_SUM] += state[DISP] * state[DISP] - disp_buffer[index] * disp_buffer[index]
+    vel_buffer[index] = state[VEL]
+    disp_buffer[index] = state[DISP]
+    if index == VEL_WINDOW - 1:
+        state[VEL_SQ_SUM] = (vel_buffer * vel_buffer).sum(axis=0)
+        state[DISP_SQ_SUM] = (disp_buffer * disp_buffer).sum(axis=0)
+
+    vel_rms = np.sqrt(np.maximum(state[VEL_SQ_SUM], 0.0) / VEL_WINDOW)
+    disp_rms = np.sqrt(np.maximum(state[DISP_SQ_SUM], 0.0) / VEL_WINDOW)
+    counters[VEL_INDEX] = (index + 1) % VEL_WINDOW
+    # Horizontal = Z, Vertical = Y, Axial = X
+    return np.concatenate((vel_rms[::-1], disp_rms[::-1]))
+
+# Compile (or load from cache) now on throwaway state so the first real sample
+# isn't stuck behind the JIT
+process_sample(np.zeros(3), np.zeros_like(ingest.state), np.zeros_like(ingest.vel_buffer),
+               np.zeros_like(ingest.disp_buffer), np.zeros_like(ingest.counters))
+
+# Status strings the server sends alongside data frames
+CONTROL_MESSAGES = frozenset(("Authenticated", "Authentication failed", "Resetting sensor..."))
+
+WS_URL = "ws://104.34.48.162:8081/"
+AUTH_MESSAGE = "Authorization: Basic YXNoOmFzaDEyMw=="
+PING_INTERVAL = 30
+
+# WebSocket functions. Everything the per-message path touches is bound as a
+# default argument so lookups are local rather than module-global.
+def handle_message(message, st=ingest, _control=CONTROL_MESSAGES, _loads=loads, _array=np.array,
+                   _abs=np.abs, _isfinite=np.isfinite, _float64=np.float64, _process=process_sample, _monotonic=time.monotonic,
+                   _flush=flush_rows, _log=logger, _limit=ACCEL_LIMIT, _batch=BATCH_SIZE,
+                   _flush_interval=FLUSH_INTERVAL, _sample_counter=SAMPLE_COUNTER, _sensor_id=sensor_id):
+    _log.debug("Received Raw: %s", message)
     try:
-        conn.rollback()
+        if message in _control:
+            _log.info("Skipping message: %s", message)
+            return
+
+        if st.row_count and _monotonic() - st.last_flush >= _flush_interval:
+            _flush()
+
+        data = _loads(message)
+        _log.debug("Parsed Data: %s", data)
+
+        # Frames without a 3-value 'a' and 'vib' are ignored
+        try:
+            x, y, z = data['a']
+            h_vib, v_vib, a_vib = data['vib']
+        except (KeyError, ValueError, TypeError):
+            return
+
+        st.sample_count += 1
+        acc = _array((x, y, z), dtype=_float64)
+        # Written as "not all within the limit" so NaN (a JSON null) and inf are
+        # rejected too; NaN would otherwise poison the filter state for good
+        if not (_abs(acc) <= _limit).all():
+            _log.warning("Skipping outlier: x=%.2f, y=%.2f, z=%.2f", acc[0], acc[1], acc[2])
+            st.counters[_sample_counter] += 1  # outliers still count toward the integrator reset
+            return
+
+        # JSON numbers may be ints; null or non-numeric vib values drop the frame
+        vib = _array((h_vib, v_vib, a_vib), dtype=_float64)
+        if not _isfinite(vib).all():
+            _log.warning("Skipping invalid vib: %s", data['vib'])
+            st.counters[_sample_counter] += 1
+            return
+
+        row = st.row_buf[st.row_count]
+        row[0] = st.sample_count
+        row[1:4] = acc
+        row[4:7] = vib
+        row[7:13] = _process(acc, st.state, st.vel_buffer, st.disp_buffer, st.counters)
+        st.row_count += 1
+        _log.debug("Added Data: sample=%d, x=%.2f, y=%.2f, z=%.2f, h_vib=%.2f, sensor_id=%d", st.sample_count, x, y, z, h_vib, _sensor_id)
+
+        if st.row_count >= _batch:
+            _flush()
+
+    except JSONDecodeError as e:
+        logger.error("JSON parsing error: %s", e)
     except Exception as e:
-        print(f"Error during rollback: {e}")
+        logger.error("Unexpected error: %s", e)
+
+# Application-level keepalive the server expects: a "ping" text frame on
+# connect and every PING_INTERVAL seconds after
+async def ping_loop(ws):
+    while True:
+        await asyncio.sleep(PING_INTERVAL)
+        await ws.send("ping")
 
-def on_close(ws, close_status_code, close_msg):
-    print("WebSocket closed")
+# While corked the kernel holds small writes and sends them as one segment on
+# uncork. TCP_CORK is Linux-only; elsewhere this is a no-op.
+def set_cork(ws, enabled):
+    sock = ws.transport.get_extra_info('socket')
+    if sock is not None and hasattr(socket, 'TCP_CORK'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, int(enabled))
+
+# Receive loop; messages, pings and the socket share one event loop while the
+# DBWriter thread does the database work
+async def main():
     try:
-        if conn:
-            if all_data:
-                cursor.executemany("""
-                    INSERT INTO samples (sample, x, y, z, h_vib, v_vib, a_vib, h_vel, v_vel, a_vel, h_disp, v_disp, a_disp, sensor_id)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, all_data)
-                conn.commit()
-                print(f"✅ Saved {len(all_data)} remaining rows to vibration_data_db")
-                all_data.clear()
-            cursor.close()
-            conn.close()
-            print("Database connection closed.")
+        async with websockets.connect(WS_URL, ping_interval=None) as ws:
+            logger.info("WebSocket connection opened")
+            # Auth and the first ping go out together in one segment
+            set_cork(ws, True)
+            try:
+                await ws.send(AUTH_MESSAGE)
+                await ws.send("ping")
+            finally:
+                set_cork(ws, False)
+            pinger = asyncio.create_task(ping_loop(ws))
+            try:
+                async for message in ws:
+                    handle_message(message)
+            finally:
+                pinger.cancel()
     except Exception as e:
-        print(f"Failed to save remaining data or close connection: {e}")
-
-def on_open(ws):
-    print("WebSocket connection opened")
-    ws.send("Authorization: Basic YXNoOmFzaDEyMw==")
-    def ping():
-        if ws.sock and ws.sock.connected:
-            ws.send("ping")
-        threading.Timer(30, ping).start()  # Ping every 30 seconds
-    ping()
+        logger.error("WebSocket error: %s", e)
+    finally:
+        logger.info("WebSocket closed")
+        # Queue the remainder, then let the writer drain everything before closing
+        flush_rows()
+        db_writer.close()
 
 if __name__ == "__main__":
-    ws = websocket.WebSocketApp("ws://104.34.48.162:8081/",
-                                on_open=on_open,
-                                on_message=on_message,
-                                on_error=on_error,
-                                on_close=on_close)
-    ws.run_forever()
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())